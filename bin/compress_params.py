@@ -0,0 +1,69 @@
+import logging
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from sqlalchemy import bindparam, create_engine, func, or_, select, text, update
+from subscrape.db.subscrape_db import Extrinsic, Event
+
+# rows rewritten per transaction
+BATCH_SIZE = 10000
+
+
+def compress_table(engine, table, column_names):
+    """Rewrites all rows of the table that still store one of the columns as JSON text. The columns are read back by
+    `CompressedJSON`, which accepts legacy text, and written again as compressed BLOBs.
+
+    :param engine: the engine of the database to migrate
+    :type engine: Engine
+    :param table: the table to migrate
+    :type table: Table
+    :param column_names: the `CompressedJSON` columns of the table
+    :type column_names: list
+    :return: the number of rewritten rows
+    """
+    columns = [table.c[name] for name in column_names]
+    legacy_rows = select(table.c.chain, table.c.id, *columns) \
+        .where(or_(*[func.typeof(column) == "text" for column in columns])) \
+        .limit(BATCH_SIZE)
+    rewrite = update(table) \
+        .where(table.c.chain == bindparam("b_chain"), table.c.id == bindparam("b_id")) \
+        .values({name: bindparam(f"b_{name}") for name in column_names})
+
+    count = 0
+    while True:
+        # rewritten rows no longer match the query, so every iteration picks up the next batch
+        with engine.begin() as connection:
+            rows = connection.execute(legacy_rows).all()
+            if not rows:
+                break
+            connection.execute(rewrite, [{f"b_{key}": value for key, value in row._mapping.items()} for row in rows])
+        count += len(rows)
+        logging.info(f"{table.name}: rewrote {count} rows")
+    return count
+
+
+def main():
+    """Converts the `params`/`error` columns of a database that was created by an older version from JSON text to
+    compressed BLOBs and then vacuums the database to give the freed pages back to the file system.
+
+    Usage: `python bin/compress_params.py [connection_string]`
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    db_connection_string = sys.argv[1] if len(sys.argv) > 1 else "sqlite:///data/cache/default.db"
+    engine = create_engine(db_connection_string)
+    if engine.dialect.name != "sqlite":
+        logging.error("only SQLite databases store JSON as text and need to be migrated. Exiting")
+        return
+
+    compress_table(engine, Extrinsic.__table__, ["params", "error"])
+    compress_table(engine, Event.__table__, ["params"])
+
+    logging.info("vacuuming...")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM"))
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -28,13 +28,13 @@ async def main():
     logging.info("transforming...")
     db = SubscrapeDB(db_connection_string)
 
-    events = db.query_events(chain=chain, module=module_name, event=event_name).all()
+    events = db.stream_events(chain=chain, module=module_name, event=event_name)
 
     # print all event ids
-    for event in events:
+    async for event in events:
         print(event.id)
 
-    db.close()
+    await db.close()
 
 
 if __name__ == "__main__":
@@ -47,6 +47,9 @@ class SubscanWrapper:
         self.logger.info(f'Subscan rate limit set to {MAX_CALLS_PER_SEC} API calls per second.')
         self.semaphore = asyncio.Semaphore(MAX_CALLS_PER_SEC)
         self.lock = asyncio.Lock()
+        # requests of all concurrently scraped calls are spaced by `1 / MAX_CALLS_PER_SEC` seconds
+        self._pace_lock = asyncio.Lock()
+        self._next_request_at = 0.0
 
         self._extrinsic_index_deducer = lambda e: e["extrinsic_index"]
         # self._events_index_deducer = lambda e: f"{e['event_index']}"
@@ -59,6 +62,18 @@ class SubscanWrapper:
         self._api_method_event = "/api/scan/event"
         self._api_method_events_call = "event_id"
 
+    async def _pace(self):
+        """
+        Waits until the next request may be sent. The semaphore only bounds the number of requests in flight, this
+        bounds the request rate across all tasks using this wrapper.
+        """
+        async with self._pace_lock:
+            now = asyncio.get_running_loop().time()
+            if self._next_request_at > now:
+                await asyncio.sleep(self._next_request_at - now)
+                now = self._next_request_at
+            self._next_request_at = now + 1 / MAX_CALLS_PER_SEC
+
     @sleep_and_retry  # be patient and sleep this thread to avoid exceeding the rate limit
     # @limits(calls=MAX_CALLS_PER_SEC, period=1)     # API limits us to 30 calls every second
     async def _query(self, method, headers={}, body={}, client=None):
@@ -85,6 +100,7 @@ class SubscanWrapper:
         response = None
         should_request = True
         while should_request:  # loop until we get a response
+            await self._pace()
             before = datetime.now()
             async with self.semaphore:
                 response = await client.post(url, headers=headers, data=body)
@@ -122,6 +138,7 @@ class SubscanWrapper:
             body={},
             filter=None,
             stop_on_known_data=True,
+            page_writer=None,
     ) -> list:
         """Repeatedly fetch transactions from Subscan.io matching a set of parameters, iterating one html page at a
         time. Perform post-processing of each transaction using the `element_processor` method provided.
@@ -139,6 +156,9 @@ class SubscanWrapper:
         :type filter: function
         :param stop_on_known_data: whether to stop iterating when we encounter a known element
         :type stop_on_known_data: bool
+        :param page_writer: coroutine that is called with the processed items of every page to store them. It runs
+            while the next page is requested.
+        :type page_writer: function
         :return: the items processed
         """
 
@@ -149,63 +169,79 @@ class SubscanWrapper:
 
         body["row"] = rows_per_page
         last_id = None
+        page_write = None       # the write of the previous page, which overlaps the request of the next one
 
-        while not done:
-            if last_id is not None:
-                body["after_id"] = last_id
+        try:
+            while not done:
+                if last_id is not None:
+                    body["after_id"] = last_id
 
-            data = await self._query(method, body=body)
-            # determine the limit on the first run
-            if limit == 0:
-                limit = data["count"]
-                self.logger.info(f"About to fetch {limit} entries.")
+                data = await self._query(method, body=body)
+                # determine the limit on the first run
                 if limit == 0:
-                    break
-            elements = data[list_key]
-
-            if elements is None:
-                self.logger.info("elements was empty. Stopping.")
-                break
-
-            for element in elements:
-                if filter is not None and filter(element):
-                    continue
-                item = element_processor(element)
-                if item:
-                    items.append(item)
-                elif stop_on_known_data:
-                    done = True
+                    limit = data["count"]
+                    self.logger.info(f"About to fetch {limit} entries.")
+                    if limit == 0:
+                        break
+                elements = data[list_key]
+
+                if elements is None:
+                    self.logger.info("elements was empty. Stopping.")
                     break
 
-            num_items = len(items)
-            self.logger.debug(num_items)
+                page_items = []
+                for element in elements:
+                    if filter is not None and filter(element):
+                        continue
+                    item = element_processor(element)
+                    if item:
+                        page_items.append(item)
+                    elif stop_on_known_data:
+                        done = True
+                        break
+
+                if page_writer is not None and len(page_items) > 0:
+                    if page_write is not None:
+                        await asyncio.shield(page_write)
+                    page_write = asyncio.ensure_future(page_writer(page_items))
+                items.extend(page_items)
+
+                num_items = len(items)
+                self.logger.debug(num_items)
+
+                if num_items >= limit:
+                    done = True
 
-            if num_items >= limit:
-                done = True
+                last_id = last_id_deducer(elements[-1])
+                self.logger.debug(f"Last ID: {last_id}")
 
-            last_id = last_id_deducer(elements[-1])
-            self.logger.debug(f"Last ID: {last_id}")
+            if page_write is not None:
+                await asyncio.shield(page_write)
+        finally:
+            # never leave a write running, e.g. while the transaction is rolled back after a failed request
+            if page_write is not None:
+                await asyncio.gather(page_write, return_exceptions=True)
 
         return items
 
-    def _create_extrinsic_metadata_processor(self, already_existing_extrinsic_pks: list):
+    def _create_extrinsic_metadata_processor(self, already_existing_extrinsic_pks: set):
         """
-        Creates a method to process extrinsic metadata and stores it in the database.
+        Creates a method to process extrinsic metadata into rows for the database.
 
-        :param already_existing_extrinsic_pks: list of primary keys of extrinsics that already exist in the database
-        :type already_existing_extrinsic_pks: list
-        :return: method to process extrinsic metadata and store it in the database
+        :param already_existing_extrinsic_pks: set of primary keys of extrinsics that already exist in the database
+        :type already_existing_extrinsic_pks: set
+        :return: method to process extrinsic metadata into a row of the `extrinsics` table
         :rtype: function
         """
 
-        def _extrinsic_metadata_processor(raw_extrinsic_metadata: dict) -> Extrinsic:
+        def _extrinsic_metadata_processor(raw_extrinsic_metadata: dict) -> dict:
             """
-            Processes extrinsic metadata and stores it in the database.
+            Processes extrinsic metadata into a row of the `extrinsics` table.
 
             :param raw_extrinsic_metadata: raw extrinsic metadata
             :type raw_extrinsic_metadata: dict
-            :return: The extrinsic
-            :rtype: Extrinsic
+            :return: The extrinsic's column values
+            :rtype: dict
             """
             # not every extrinsic has a sender
             if raw_extrinsic_metadata["account_display"] is not None:
@@ -218,7 +254,7 @@ class SubscanWrapper:
             if (self.chain, extrinsic_id) in already_existing_extrinsic_pks:
                 return None
 
-            extrinsic = Extrinsic(
+            return dict(
                 chain=self.chain,
                 id=extrinsic_id,
                 block_number=raw_extrinsic_metadata["block_num"],
@@ -235,30 +271,27 @@ class SubscanWrapper:
                 finalized=raw_extrinsic_metadata["finalized"],
             )
 
-            self.db.write_item(extrinsic)
-            return extrinsic
-
         return _extrinsic_metadata_processor
 
-    def _create_event_metadata_processor(self, already_existing_event_pks: list):
+    def _create_event_metadata_processor(self, already_existing_event_pks: set):
         """
-        Creates a function that processes event metadata and stores it in the database.
+        Creates a function that processes event metadata into rows for the database.
         `already_existing_event_pks` is used to prevent duplicate events from being written to the database.
 
-        :param already_existing_event_pks: a list of event primary keys that already exist in the database
-        :type already_existing_event_pks: list
+        :param already_existing_event_pks: a set of event primary keys that already exist in the database
+        :type already_existing_event_pks: set
         :return: The function that can be used to process an element in the list
         :rtype: function
         """
 
-        def _event_metadata_processor(raw_event_metadata: dict) -> Event:
+        def _event_metadata_processor(raw_event_metadata: dict) -> dict:
             """
-            Processes event metadata and stores it in the database.
+            Processes event metadata into a row of the `events` table.
 
             :param raw_event_metadata: raw event metadata
             :type raw_event_metadata: dict
-            :return: The event
-            :rtype: Event
+            :return: The event's column values
+            :rtype: dict
             """
             event_id = raw_event_metadata["event_index"]
 
@@ -268,7 +301,7 @@ class SubscanWrapper:
             # block_number is the string until the hyphen
             block_number = int(raw_event_metadata["event_index"].split("-")[0])
 
-            event = Event(
+            return dict(
                 chain=self.chain,
                 id=event_id,
                 block_number=block_number,
@@ -279,9 +312,6 @@ class SubscanWrapper:
                 finalized=raw_event_metadata["finalized"],
             )
 
-            self.db.write_item(event)
-            return event
-
         return _event_metadata_processor
 
     def update_extrinsic_from_raw_extrinsic(self, extrinsic: Extrinsic, raw_extrinsic: dict):
@@ -351,14 +381,17 @@ class SubscanWrapper:
         self.logger.info(f"Fetching extrinsic {module}.{call} from {self.endpoint}")
 
         # create a list of already fetched extrinsics
-        already_fetched_extrinsics = self.db.query_extrinsics(chain=self.chain, module=module, call=call).all()
-        already_fetched_extrinsic_pks = [(e.chain, e.id) for e in already_fetched_extrinsics]
+        already_fetched_extrinsics = self.db.stream_extrinsics(
+            chain=self.chain, module=module, call=call, columns=[Extrinsic.chain, Extrinsic.id])
+        already_fetched_extrinsic_pks = {(e.chain, e.id) async for e in already_fetched_extrinsics}
+        # end the read so that no pooled connection is held while waiting for Subscan
+        await self.db.flush()
 
         body = {"module": module, "call": call}
         if config.params is not None:
             body.update(config.params)
 
-        items = await self._iterate_pages(
+        rows = await self._iterate_pages(
             self._api_method_extrinsics,
             self._create_extrinsic_metadata_processor(already_fetched_extrinsic_pks),
             last_id_deducer=self._last_id_deducer,
@@ -366,14 +399,20 @@ class SubscanWrapper:
             body=body,
             filter=config.filter,
             stop_on_known_data=config.stop_on_known_data,
+            page_writer=self.db.write_extrinsics,
         )
 
-        self.db.flush()
+        # the pages are written within the transaction of this call and only committed once the index is complete.
+        # A partially written index would make the next run with `stop_on_known_data` stop at its newest entries
+        await self.db.flush()
 
+        # hydration loads the full objects anyway, so only materialize the metadata rows if we return them
         if config.auto_hydrate is True:
             self.logger.info(f"Hydrating extrinsics {module}.{call} from {self.endpoint}")
-            extrinsic_indexes = [e.id for e in items]
+            extrinsic_indexes = [row["id"] for row in rows]
             items = await self.fetch_extrinsics(extrinsic_indexes)
+        else:
+            items = [Extrinsic(**row) for row in rows]
 
         return items
 
@@ -393,12 +432,16 @@ class SubscanWrapper:
 
         self.logger.info("Building list of extrinsics to fetch...")
 
-        already_fetched_extrinsics = self.db.query_extrinsics(chain=self.chain, extrinsic_ids=extrinsic_indexes).all()
-        already_fetched_extrinsic_ids = [e.id for e in already_fetched_extrinsics]
-
         # if we do not update existing items, we only need to fetch the ones that are not in the db
         if update_existing is False:
-            extrinsic_indexes = already_fetched_extrinsic_ids
+            extrinsic_indexes = await self.db.missing_extrinsics_from_index_list(self.chain, extrinsic_indexes)
+            already_fetched_extrinsics = {}
+        else:
+            already_fetched_extrinsics = {
+                e.id: e for e in await self.db.query_extrinsics(chain=self.chain, extrinsic_ids=extrinsic_indexes)
+            }
+        # end the read so that no pooled connection is held while waiting for Subscan
+        await self.db.flush()
 
         self.logger.info(f"Fetching {len(extrinsic_indexes)} extrinsics from {self.endpoint}")
 
@@ -418,27 +461,25 @@ class SubscanWrapper:
 
                     self.logger.debug(f"Spawning task for {extrinsic_index}")
                     future = asyncio.ensure_future(task)
-                    await asyncio.sleep(1 / MAX_CALLS_PER_SEC)
                     futures.append(future)
 
                 raw_extrinsics = await asyncio.gather(*futures)
 
+                new_items = []
                 for raw_extrinsic in raw_extrinsics:
                     extrinsic_id = self._extrinsic_index_deducer(raw_extrinsic)
 
-                    if extrinsic_id in already_fetched_extrinsic_ids:
-                        extrinsic = self.db.query_extrinsic(self.chain, extrinsic_id)
-                    else:
+                    extrinsic = already_fetched_extrinsics.get(extrinsic_id)
+                    if extrinsic is None:
                         extrinsic = Extrinsic()
                     self.update_extrinsic_from_raw_extrinsic(extrinsic, raw_extrinsic)
+                    new_items.append(extrinsic)
 
-                    self.db.write_item(extrinsic)
-                    items.append(extrinsic)
+                await self.db.write_items(new_items)
+                await self.db.flush()
+                items.extend(new_items)
 
-                self.db.flush()
-
-                for index in batch:
-                    extrinsic_indexes.remove(index)
+                extrinsic_indexes = extrinsic_indexes[len(batch):]
 
                 self.logger.info(f"Done fetching {len(items)} extrinsics. {len(extrinsic_indexes)} remaining.")
 
@@ -462,14 +503,17 @@ class SubscanWrapper:
         self.logger.info(f"Fetching events {module}.{call} from {self.endpoint}")
 
         # create a list of already fetched event ids
-        already_fetched_events = self.db.query_events(chain=self.chain, module=module, event=call).all()
-        already_fetched_event_pks = [(e.chain, e.id) for e in already_fetched_events]
+        already_fetched_events = self.db.stream_events(
+            chain=self.chain, module=module, event=call, columns=[Event.chain, Event.id])
+        already_fetched_event_pks = {(e.chain, e.id) async for e in already_fetched_events}
+        # end the read so that no pooled connection is held while waiting for Subscan
+        await self.db.flush()
 
         body = {"module": module, self._api_method_events_call: call}
         if config.params is not None:
             body.update(config.params)
 
-        items = await self._iterate_pages(
+        rows = await self._iterate_pages(
             self._api_method_events,
             self._create_event_metadata_processor(already_fetched_event_pks),
             last_id_deducer=self._last_id_deducer,
@@ -477,14 +521,20 @@ class SubscanWrapper:
             body=body,
             filter=config.filter,
             stop_on_known_data=config.stop_on_known_data,
+            page_writer=self.db.write_events,
         )
 
-        self.db.flush()
+        # the pages are written within the transaction of this call and only committed once the index is complete.
+        # A partially written index would make the next run with `stop_on_known_data` stop at its newest entries
+        await self.db.flush()
 
+        # hydration loads the full objects anyway, so only materialize the metadata rows if we return them
         if config.auto_hydrate is True:
             self.logger.info(f"Hydrating events from {module}.{call} from {self.endpoint}")
-            event_indexes = [e.id for e in items]
+            event_indexes = [row["id"] for row in rows]
             items = await self.fetch_events(event_indexes)
+        else:
+            items = [Event(**row) for row in rows]
 
         return items
 
@@ -502,12 +552,16 @@ class SubscanWrapper:
 
         items = []
 
-        already_fetched_events = self.db.query_events(chain=self.chain, event_ids=event_indexes).all()
-        already_fetched_event_ids = [e.id for e in already_fetched_events]
-
         # if we do not update existing items, we only need to fetch the ones that are not in the db
         if update_existing is False:
-            event_indexes = already_fetched_event_ids
+            event_indexes = await self.db.missing_events_from_index_list(self.chain, event_indexes)
+            already_fetched_events = {}
+        else:
+            already_fetched_events = {
+                e.id: e for e in await self.db.query_events(chain=self.chain, event_ids=event_indexes)
+            }
+        # end the read so that no pooled connection is held while waiting for Subscan
+        await self.db.flush()
 
         self.logger.info(f"Fetching {len(event_indexes)} events from {self.endpoint}")
 
@@ -527,26 +581,24 @@ class SubscanWrapper:
 
                     self.logger.debug(f"Spawning task for {event_index}")
                     future = asyncio.ensure_future(task)
-                    await asyncio.sleep(1 / MAX_CALLS_PER_SEC)
                     futures.append(future)
 
                 raw_events = await asyncio.gather(*futures)
 
+                new_items = []
                 for raw_event in raw_events:
                     event_id = self._event_index_deducer(raw_event)
 
-                    if event_id in already_fetched_event_ids:
-                        event = self.db.query_event(self.chain, event_id)
-                    else:
+                    event = already_fetched_events.get(event_id)
+                    if event is None:
                         event = Event()
                     self.update_event_from_raw_event(event, raw_event)
+                    new_items.append(event)
 
-                    self.db.write_item(event)
-                    items.append(event)
-
-                self.db.flush()
+                await self.db.write_items(new_items)
+                await self.db.flush()
+                items.extend(new_items)
 
-                for id in batch:
-                    event_indexes.remove(id)
+                event_indexes = event_indexes[len(batch):]
 
         return items
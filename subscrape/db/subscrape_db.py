@@ -1,13 +1,77 @@
 __author__ = 'Tommi Enenkel @alice_und_bob'
 
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
 import os
 import logging
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, JSON, DateTime, ForeignKey, ForeignKeyConstraint
-from sqlalchemy.orm import Session, Query, relationship
-from sqlalchemy.ext.declarative import declarative_base
+import zlib
+from collections import OrderedDict
+from typing import Dict
+from pybloom_live import ScalableBloomFilter
+from sqlalchemy import create_engine, event, lambda_stmt, literal_column, select, Column, Integer, String, Boolean, \
+    DateTime, ForeignKey, ForeignKeyConstraint, Index, LargeBinary
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncAttrs, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy_utils import database_exists, create_database
 
-Base = declarative_base()
+# `AsyncAttrs` allows awaiting lazy relationships, e.g. `await extrinsic.awaitable_attrs.events`
+Base = declarative_base(cls=AsyncAttrs)
+
+# tuned for a write-heavy cache: WAL avoids an fsync of the rollback journal on every commit
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",  # in KiB, i.e. 256 MiB
+]
+# stay below SQLite's default SQLITE_MAX_VARIABLE_NUMBER (999) when filtering with `IN (...)`
+ID_CHUNK_SIZE = 900
+# number of extrinsics/events kept in memory by query_extrinsic()/query_event()
+READ_CACHE_SIZE = 4096
+# rows fetched from SQLite at a time by the stream_<type>() methods
+STREAM_CHUNK_SIZE = 1000
+# memory mapped I/O is opt-in, as it is not available in every (CI) container
+SQLITE_MMAP_SIZE_ENV = "SUBSCRAPE_SQLITE_MMAP_SIZE"
+
+# connections of the pool of an engine
+POOL_SIZE = 5
+POOL_MAX_OVERFLOW = 10
+
+# engines are shared between `SubscrapeDB` instances so that connections (and SQLite's page cache) stay warm
+_ENGINE_CACHE: Dict[str, AsyncEngine] = {}
+
+
+class CompressedJSON(TypeDecorator):
+    """
+    Stores JSON serializable values as zlib compressed BLOBs. Subscan params repeat the same keys in every row, so
+    they compress well, which keeps the database and thus SQLite's page cache small.
+    Values that were stored as JSON text by older versions are still read, see `bin/compress_params.py` to convert
+    them.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return json.loads(zlib.decompress(value))
+        if isinstance(value, str):
+            # legacy JSON text
+            return json.loads(value)
+        # already decoded by a native JSON column
+        return value
 
 
 class Block(Base):
@@ -28,17 +92,24 @@ class Extrinsic(Base):
     nonce = Column(Integer)
     extrinsic_hash = Column(String(100))
     success = Column(Boolean)
-    params = Column(JSON)
+    params = Column(CompressedJSON)
     # event
     # event_count
     fee = Column(Integer)
     fee_used = Column(Integer)
-    error = Column(JSON)
+    error = Column(CompressedJSON)
     finalized = Column(Boolean)
     tip = Column(Integer)
 
     events = relationship("Event", back_populates="extrinsic")
 
+    __table_args__ = (
+        Index("ix_extrinsic_module_call", "module", "call"),
+        Index("ix_extrinsic_origin_address", "origin_address"),
+        # not unique: the same hash can occur on several chains and Subscan may report it more than once
+        Index("ix_extrinsic_hash", "extrinsic_hash"),
+    )
+
 
 class Event(Base):
     __tablename__ = 'events'
@@ -49,17 +120,61 @@ class Event(Base):
     extrinsic_id = Column(String(20))
     module = Column(String(100))
     event = Column(String(100))
-    params = Column(JSON)
+    params = Column(CompressedJSON)
     finalized = Column(Boolean)
 
     __table_args__ = (
         ForeignKeyConstraint([extrinsic_id, chain],
                              [Extrinsic.id, Extrinsic.chain]),
+        Index("ix_event_module_event", "module", "event"),
     )
 
     extrinsic = relationship("Extrinsic", back_populates="events")
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    `connect` event handler that applies `SQLITE_PRAGMAS` to every new SQLite connection.
+    """
+    pragmas = list(SQLITE_PRAGMAS)
+    mmap_size = os.environ.get(SQLITE_MMAP_SIZE_ENV)
+    if mmap_size:
+        pragmas.append(f"PRAGMA mmap_size={int(mmap_size)}")
+
+    cursor = dbapi_connection.cursor()
+    for pragma in pragmas:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+class _SessionState:
+    """
+    A session of `SubscrapeDB` and its bookkeeping: either the shared session or the session of a task that runs
+    inside `SubscrapeDB.transaction()`.
+    """
+
+    def __init__(self, session: AsyncSession = None):
+        self.session = session
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        self.writing = False    # whether the session holds the write gate
+
+
+def _serialized(method):
+    """
+    Decorator that makes calls to a `SubscrapeDB` coroutine mutually exclusive. An `AsyncSession` must not be used by
+    several tasks at the same time, but the scraper fetches multiple calls concurrently.
+    The shared session is opened on the first call.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        async with self._lock:
+            await self._connect()
+            return await method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class SubscrapeDB:
     """
     This class is used to support online scraping of various types of data.
@@ -67,53 +182,368 @@ class SubscrapeDB:
     To accommodate this behavior, before scraping begins the DB object must be parameterized by calling
     set_active_<type>().
     At the end of the process, flush_<type>() is called to make sure the state is properly saved.
+
+    All methods that touch the database are coroutines backed by an `AsyncSession`, so that the scraper can keep
+    fetching from the web while SQLite is busy. The database is created and its schema is checked on first use, in a
+    worker thread, so constructing the object never blocks the event loop.
+    Tasks that run concurrently should each use their own session via `transaction()`, otherwise one task's `flush()`
+    also commits the pending writes of the others.
     """
 
-    def __init__(self, connection_string="sqlite:///data/cache/default.db"):
+    def __init__(self, connection_string="sqlite:///data/cache/default.db", batch_size=1000):
         self.logger = logging.getLogger(__name__)
-        self._engine = create_engine(connection_string)
+        self._batch_size = batch_size   # pending items after which INSERTs are pushed to SQLite
+        # ids of stored events. synced with the database by `missing_events_from_index_list`
+        self._event_id_bloom = ScalableBloomFilter(error_rate=0.01, mode=ScalableBloomFilter.LARGE_SET_GROWTH)
+        self._event_id_bloom_rowid = 0  # highest rowid of the `events` table that is in the bloom filter
+        self._event_id_bloom_lock = asyncio.Lock()
+        self._read_cache = OrderedDict()    # LRU of (model, chain, id) -> item, only used by the shared session
+        self._connection_string = connection_string
+        self._engine: AsyncEngine = None
+        self._sessionmaker = None
+        # the session used outside of `transaction()`
+        self._shared = _SessionState()
+        # the session of the current task inside `transaction()`. every task runs in a copy of the context, so
+        # concurrent tasks do not see each other's session
+        self._task_state = contextvars.ContextVar(f"subscrape_db_task_state_{id(self)}", default=None)
+        # SQLite allows a single writer. A session holds this gate from its first write until it commits or rolls
+        # back, so that other sessions wait for it here instead of running into SQLite's busy timeout
+        self._write_gate = asyncio.Lock()
+
+    @property
+    def _state(self) -> _SessionState:
+        task_state = self._task_state.get()
+        return self._shared if task_state is None else task_state
+
+    @property
+    def _session(self) -> AsyncSession:
+        return self._state.session
+
+    @property
+    def _lock(self) -> asyncio.Lock:
+        return self._state.lock
+
+    @property
+    def _pending(self) -> int:
+        return self._state.pending
+
+    @_pending.setter
+    def _pending(self, value: int):
+        self._state.pending = value
+
+    async def _connect(self):
+        """
+        Opens the shared session on first use. `sqlalchemy_utils` and the schema setup are synchronous, so they are
+        run in a worker thread instead of on the event loop.
+        """
+        if self._session is not None:
+            return
 
-        if not database_exists(self._engine.url):
+        connection_string = self._connection_string
+        # `asyncio.to_thread` would require Python 3.9
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, database_exists, connection_string):
             # ensure that the folder exists
             os.makedirs(os.path.dirname(connection_string.replace("sqlite:///", "")), exist_ok=True)
-            create_database(self._engine.url)
-            self._setup_db()
+            await loop.run_in_executor(None, create_database, connection_string)
+
+            # pooled connections of a cached engine still point to the file that has been wiped
+            stale_engine = _ENGINE_CACHE.pop(connection_string, None)
+            if stale_engine is not None:
+                stale_engine.sync_engine.dispose(close=False)
+            self._reset_event_id_bloom()
 
-        self._session = Session(bind=self._engine)
+        # the schema only needs to be checked once per database and process
+        if connection_string not in _ENGINE_CACHE:
+            await loop.run_in_executor(None, self._setup_db, connection_string)
 
-    def _setup_db(self):
+        self._engine = self._get_engine(connection_string)
+        self._sessionmaker = async_sessionmaker(self._engine, expire_on_commit=False)
+        self._shared.session = self._sessionmaker()
+
+    @staticmethod
+    def _get_engine(connection_string) -> AsyncEngine:
+        """
+        Returns the pooled async engine for the given connection string, creating it on first use.
+
+        :param connection_string: The synchronous SQLAlchemy connection string
+        :type connection_string: str
+        :return: The engine
+        :rtype: AsyncEngine
         """
-        Creates the database tables if they do not exist.
+        engine = _ENGINE_CACHE.get(connection_string)
+        if engine is None:
+            engine = create_async_engine(
+                connection_string.replace("sqlite:///", "sqlite+aiosqlite:///"),
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=POOL_SIZE,
+                max_overflow=POOL_MAX_OVERFLOW,
+            )
+            if engine.dialect.name == "sqlite":
+                event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+            _ENGINE_CACHE[connection_string] = engine
+        return engine
+
+    def _setup_db(self, connection_string):
         """
-        Base.metadata.create_all(self._engine)
+        Creates the database tables and indexes if they do not exist. Indexes are created separately, so that they
+        are also added to databases that were created by an older version.
 
-    def flush(self):
+        :param connection_string: The synchronous SQLAlchemy connection string
+        :type connection_string: str
         """
-        Flush the extrinsics to the database.
+        engine = create_engine(connection_string)
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", _set_sqlite_pragmas)
+        Base.metadata.create_all(engine)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(engine, checkfirst=True)
+        engine.dispose()
+
+    async def _begin_write(self):
         """
-        self._session.commit()
+        Acquires the write gate for the current session before its first uncommitted write. Only needed for SQLite.
+        """
+        state = self._state
+        if not state.writing and self._engine.dialect.name == "sqlite":
+            await self._write_gate.acquire()
+            state.writing = True
 
-    def close(self):
+    def _end_write(self, state: _SessionState):
         """
-        Close the database connection.
+        Releases the write gate after the session committed or rolled back.
+
+        :param state: The session that ended its transaction
+        :type state: _SessionState
         """
-        self._session.close()
+        if state.writing:
+            state.writing = False
+            self._write_gate.release()
 
-    def write_item(self, item: Base):
+    @_serialized
+    async def flush(self):
+        """
+        Flush the extrinsics to the database.
+        """
+        await self._session.commit()
+        self._pending = 0
+        self._end_write(self._state)
+
+    async def close(self):
+        """
+        Close the shared session and return its connection to the pool. The next call opens a new session.
+        """
+        async with self._shared.lock:
+            if self._shared.session is None:
+                return
+            await self._shared.session.close()
+            self._shared.session = None
+            self._shared.pending = 0
+            self._end_write(self._shared)
+            # cached items are detached from the session now
+            self._read_cache.clear()
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """
+        Runs the body with its own session, e.g. for one of several calls that are scraped concurrently. All calls of
+        the current task use this session instead of the shared one, so `flush()` only commits the writes of this
+        task. What is pending at the end is committed. If the body raises or is cancelled, the pending writes are
+        rolled back. Nested transactions reuse the session of the outer one.
+        On SQLite, only one session at a time can have uncommitted writes. The others wait at their first write
+        until it commits or rolls back.
+        Event ids that are rolled back stay in the bloom filter, which only costs an exact lookup later.
+        """
+        if self._task_state.get() is not None:
+            yield
+            return
+
+        async with self._shared.lock:
+            await self._connect()
+
+        task_state = _SessionState(self._sessionmaker())
+        token = self._task_state.set(task_state)
+        try:
+            yield
+            await task_state.session.commit()
+        except BaseException:
+            await task_state.session.rollback()
+            raise
+        finally:
+            self._task_state.reset(token)
+            self._end_write(task_state)
+            await task_state.session.close()
+
+    @_serialized
+    async def write_item(self, item: Base):
         """
         Write this item to the database.
 
         :param item: The item to write
         :type item: Base
         """
+        await self._begin_write()
         self._session.add(item)
-        self._extrinsics_storage_managers = {}
+        self._forget_cached_items([item])
+        if isinstance(item, Event):
+            self._remember_event_ids([item])
+        await self._track_pending(1)
+
+    @_serialized
+    async def write_items(self, items):
+        """
+        Write these items to the database.
+
+        :param items: The items to write
+        :type items: iterable
+        """
+        items = list(items)
+        await self._begin_write()
+        self._session.add_all(items)
+        self._forget_cached_items(items)
+        self._remember_event_ids([item for item in items if isinstance(item, Event)])
+        await self._track_pending(len(items))
+
+    async def _write_rows_bulk(self, table, rows: list):
+        """
+        Inserts plain rows through SQLAlchemy Core, which skips the ORM's per-object bookkeeping.
+        On SQLite, rows whose primary key already exists are skipped by `INSERT ... ON CONFLICT DO NOTHING` instead
+        of failing the whole transaction with an `IntegrityError`.
+
+        :param table: The table to insert into
+        :type table: Table
+        :param rows: The rows to insert as dicts. All rows need to have the same keys.
+        :type rows: list
+        """
+        await self._begin_write()
+        if self._engine.dialect.name == "sqlite":
+            statement = sqlite_insert(table).on_conflict_do_nothing()
+        else:
+            statement = table.insert()
+
+        for i in range(0, len(rows), self._batch_size):
+            await self._session.execute(statement, rows[i:i + self._batch_size])
+
+    async def _query_existing_ids(self, model, chain: str, ids: list) -> set:
+        """
+        Returns the subset of `ids` that is stored for the given chain. Only the `id` column is loaded.
+
+        :param model: `Extrinsic` or `Event`
+        :type model: Base
+        :param chain: The chain to filter for
+        :type chain: str
+        :param ids: The ids to look up
+        :type ids: list
+        :return: The ids that exist in the database
+        :rtype: set
+        """
+        existing = set()
+        for i in range(0, len(ids), ID_CHUNK_SIZE):
+            query = select(model.id).where(model.chain == chain, model.id.in_(ids[i:i + ID_CHUNK_SIZE]))
+            existing.update((await self._session.execute(query)).scalars())
+        return existing
+
+    async def _stream(self, query, scalars: bool):
+        """
+        Executes the query as a stream and yields its results. The lock is only held while a chunk is fetched, so
+        the database can be used while iterating.
+
+        :param query: The statement to execute
+        :type query: Executable
+        :param scalars: Whether to yield ORM objects instead of rows
+        :type scalars: bool
+        """
+        async with self._lock:
+            await self._connect()
+            result = await self._session.stream(query, execution_options={"yield_per": STREAM_CHUNK_SIZE})
+        if scalars:
+            result = result.scalars()
+        try:
+            while True:
+                async with self._lock:
+                    chunk = await result.fetchmany(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                for item in chunk:
+                    yield item
+        finally:
+            async with self._lock:
+                await result.close()
+
+    async def _get_cached(self, model, chain: str, item_id: str):
+        """
+        Reads an item by primary key, serving repeated reads from an LRU cache of the last `READ_CACHE_SIZE` items.
+        The session's identity map only holds weak references, so without the cache a repeated read of an item
+        that is no longer referenced goes to SQLite again.
+
+        :param model: `Extrinsic` or `Event`
+        :type model: Base
+        :param chain: The chain of the item
+        :type chain: str
+        :param item_id: The id of the item
+        :type item_id: str
+        :return: The item or None if it does not exist
+        """
+        # items of a task session are detached once its transaction ends, so they must not be shared
+        if self._task_state.get() is not None:
+            return await self._session.get(model, (chain, item_id))
+
+        key = (model, chain, item_id)
+        item = self._read_cache.get(key)
+        if item is not None:
+            self._read_cache.move_to_end(key)
+            return item
+
+        item = await self._session.get(model, (chain, item_id))
+        if item is not None:
+            self._read_cache[key] = item
+            if len(self._read_cache) > READ_CACHE_SIZE:
+                self._read_cache.popitem(last=False)
+        return item
+
+    def _forget_cached_items(self, items: list):
+        """
+        Removes the given items from the read cache, as they are about to be (re)written.
+
+        :param items: The items that are written
+        :type items: list
+        """
+        for item in items:
+            if isinstance(item, (Extrinsic, Event)):
+                self._read_cache.pop((type(item), item.chain, item.id), None)
+
+    async def _track_pending(self, count: int):
+        """
+        Keeps count of the items added since the last flush. Once `batch_size` is exceeded, the INSERTs are sent to
+        SQLite so that the unit of work stays small. The transaction is only committed in `flush()`.
+
+        :param count: The number of items that were added
+        :type count: int
+        """
+        self._pending += count
+        if self._pending >= self._batch_size:
+            await self._session.flush()
+            self._pending = 0
 
     """ # Extrinsics """
 
-    def query_extrinsics(self, chain: str = None, module: str = None, call: str = None, extrinsic_ids: list = None) -> Query:
+    @_serialized
+    async def write_extrinsics(self, rows: list):
+        """
+        Write extrinsics to the database without creating ORM objects for them. Already stored extrinsics are
+        skipped.
+
+        :param rows: The extrinsics as dicts of column values
+        :type rows: list
+        """
+        await self._write_rows_bulk(Extrinsic.__table__, rows)
+
+    @_serialized
+    async def query_extrinsics(self, chain: str = None, module: str = None, call: str = None,
+                               extrinsic_ids: list = None, columns: list = None) -> list:
         """
-        Returns a query object for extrinsics.
+        Returns the extrinsics matching the given filters.
 
         :param chain: The chain to filter for
         :type chain: str
@@ -121,22 +551,79 @@ class SubscrapeDB:
         :type module: str
         :param call: The call to filter for
         :type call: str
-        :return: The query object
-        :rtype: Query
+        :param extrinsic_ids: The ids of the extrinsics to filter for
+        :type extrinsic_ids: list
+        :param columns: Only load these columns, e.g. `[Extrinsic.id, Extrinsic.extrinsic_hash]`. The result then
+            consists of plain rows instead of `Extrinsic` objects, which also keeps them out of the session.
+        :type columns: list
+        :return: The extrinsics
+        :rtype: list
+        """
+        query = self._extrinsics_query(chain, module, call, extrinsic_ids, columns)
+        result = await self._session.execute(query)
+        return result.scalars().all() if columns is None else result.all()
+
+    @staticmethod
+    def _extrinsics_query(chain: str, module: str, call: str, extrinsic_ids: list, columns: list):
+        """
+        Builds the statement behind `query_extrinsics` and `stream_extrinsics`. See there for the parameters.
         """
-        query = self._session.query(Extrinsic)
+        # lambda statements are constructed and compiled only once per combination of filters
+        if columns is None:
+            query = lambda_stmt(lambda: select(Extrinsic))
+        else:
+            columns = tuple(columns)
+            query = lambda_stmt(lambda: select(*columns), track_on=[columns])
         if chain is not None:
-            query = query.filter(Extrinsic.chain == chain)
+            query += lambda q: q.where(Extrinsic.chain == chain)
         if module is not None:
-            query = query.filter(Extrinsic.module == module)
+            query += lambda q: q.where(Extrinsic.module == module)
         if call is not None:
-            query = query.filter(Extrinsic.call == call)
+            query += lambda q: q.where(Extrinsic.call == call)
         if extrinsic_ids is not None:
-            query = query.filter(Extrinsic.id.in_(extrinsic_ids))
-
+            query += lambda q: q.where(Extrinsic.id.in_(extrinsic_ids))
         return query
 
-    def query_extrinsic(self, chain: str, extrinsic_id: str) -> Extrinsic:
+    def stream_extrinsics(self, chain: str = None, module: str = None, call: str = None,
+                          extrinsic_ids: list = None, columns: list = None):
+        """
+        Streams the extrinsics matching the given filters. Rows are fetched from SQLite in chunks of
+        `STREAM_CHUNK_SIZE` instead of loading the whole result into memory. Use it with `async for`.
+
+        :param chain: The chain to filter for
+        :type chain: str
+        :param module: The module to filter for
+        :type module: str
+        :param call: The call to filter for
+        :type call: str
+        :param extrinsic_ids: The ids of the extrinsics to filter for
+        :type extrinsic_ids: list
+        :param columns: Only load these columns, e.g. `[Extrinsic.id, Extrinsic.extrinsic_hash]`. Yields plain
+            rows instead of `Extrinsic` objects then.
+        :type columns: list
+        :return: An async iterator over the extrinsics
+        :rtype: AsyncIterator
+        """
+        query = self._extrinsics_query(chain, module, call, extrinsic_ids, columns)
+        return self._stream(query, scalars=columns is None)
+
+    @_serialized
+    async def missing_extrinsics_from_index_list(self, chain: str, index_list: list) -> list:
+        """
+        Returns the extrinsic ids from `index_list` that are not yet stored in the database.
+
+        :param chain: The chain to filter for
+        :type chain: str
+        :param index_list: The extrinsic ids to check, e.g. ["123456-2"]
+        :type index_list: list
+        :return: The missing extrinsic ids, in the order of `index_list`
+        :rtype: list
+        """
+        existing = await self._query_existing_ids(Extrinsic, chain, index_list)
+        return [index for index in index_list if index not in existing]
+
+    @_serialized
+    async def query_extrinsic(self, chain: str, extrinsic_id: str) -> Extrinsic:
         """
         Returns the extrinsic with the given id.
 
@@ -147,13 +634,26 @@ class SubscrapeDB:
         :return: The extrinsic
         :rtype: Extrinsic
         """
-        return self._session.query(Extrinsic).get((chain, extrinsic_id))
+        return await self._get_cached(Extrinsic, chain, extrinsic_id)
 
     """ # Events """
 
-    def query_events(self, chain: str = None, module: str = None, event: str = None, event_ids: list = None) -> Query:
+    @_serialized
+    async def write_events(self, rows: list):
+        """
+        Write events to the database without creating ORM objects for them. Already stored events are skipped.
+
+        :param rows: The events as dicts of column values
+        :type rows: list
+        """
+        await self._write_rows_bulk(Event.__table__, rows)
+        self._remember_event_ids(rows)
+
+    @_serialized
+    async def query_events(self, chain: str = None, module: str = None, event: str = None,
+                           event_ids: list = None, columns: list = None) -> list:
         """
-        Returns a query object for events.
+        Returns the events matching the given filters.
 
         :param chain: The chain to filter for
         :type chain: str
@@ -163,21 +663,130 @@ class SubscrapeDB:
         :type event: str
         :param event_ids: The ids of the events to filter for
         :type event_ids: list
-        :return: The query object
-        :rtype: Query
+        :param columns: Only load these columns, e.g. `[Event.id, Event.extrinsic_id]`. The result then consists of
+            plain rows instead of `Event` objects, which also keeps them out of the session.
+        :type columns: list
+        :return: The events
+        :rtype: list
         """
-        query = self._session.query(Event)
+        query = self._events_query(chain, module, event, event_ids, columns)
+        result = await self._session.execute(query)
+        return result.scalars().all() if columns is None else result.all()
+
+    @staticmethod
+    def _events_query(chain: str, module: str, event: str, event_ids: list, columns: list):
+        """
+        Builds the statement behind `query_events` and `stream_events`. See there for the parameters.
+        """
+        # lambda statements are constructed and compiled only once per combination of filters
+        if columns is None:
+            query = lambda_stmt(lambda: select(Event))
+        else:
+            columns = tuple(columns)
+            query = lambda_stmt(lambda: select(*columns), track_on=[columns])
         if chain is not None:
-            query = query.filter(Event.chain == chain)
+            query += lambda q: q.where(Event.chain == chain)
         if module is not None:
-            query = query.filter(Event.module == module)
+            query += lambda q: q.where(Event.module == module)
         if event is not None:
-            query = query.filter(Event.event == event)
+            query += lambda q: q.where(Event.event == event)
         if event_ids is not None:
-            query = query.filter(Event.id.in_(event_ids))
+            query += lambda q: q.where(Event.id.in_(event_ids))
         return query
 
-    def query_event(self, chain: str, event_id: str) -> Event:
+    def stream_events(self, chain: str = None, module: str = None, event: str = None, event_ids: list = None,
+                      columns: list = None):
+        """
+        Streams the events matching the given filters. Rows are fetched from SQLite in chunks of
+        `STREAM_CHUNK_SIZE` instead of loading the whole result into memory. Use it with `async for`.
+
+        :param chain: The chain to filter for
+        :type chain: str
+        :param module: The module to filter for
+        :type module: str
+        :param event: The event to filter for
+        :type event: str
+        :param event_ids: The ids of the events to filter for
+        :type event_ids: list
+        :param columns: Only load these columns, e.g. `[Event.id, Event.extrinsic_id]`. Yields plain rows instead
+            of `Event` objects then.
+        :type columns: list
+        :return: An async iterator over the events
+        :rtype: AsyncIterator
+        """
+        query = self._events_query(chain, module, event, event_ids, columns)
+        return self._stream(query, scalars=columns is None)
+
+    @staticmethod
+    def _event_bloom_key(chain: str, event_id: str) -> str:
+        return f"{chain}/{event_id}"
+
+    def _remember_event_ids(self, events: list):
+        """
+        Adds the given events to the bloom filter of stored event ids. They are found by the sessions of this object
+        before they are committed, so that a lookup in the writing task does not miss them.
+
+        :param events: `Event` objects or event rows as dicts
+        :type events: list
+        """
+        for event in events:
+            if isinstance(event, dict):
+                self._event_id_bloom.add(self._event_bloom_key(event["chain"], event["id"]))
+            else:
+                self._event_id_bloom.add(self._event_bloom_key(event.chain, event.id))
+
+    def _reset_event_id_bloom(self):
+        self._event_id_bloom = ScalableBloomFilter(error_rate=0.01, mode=ScalableBloomFilter.LARGE_SET_GROWTH)
+        self._event_id_bloom_rowid = 0
+
+    async def _sync_event_id_bloom(self) -> ScalableBloomFilter:
+        """
+        Adds the events that were committed since the last sync to the bloom filter of stored event ids, no matter
+        whether by this object, another `SubscrapeDB` or another process. SQLite assigns ascending rowids and writers
+        are serialized, so these are exactly the rows above the highest rowid seen so far. The first sync loads all
+        events.
+        The rows are read with a connection of their own: the current session might still hold uncommitted writes
+        that could be rolled back, and their rowids could then be handed out again.
+
+        :return: The bloom filter
+        :rtype: ScalableBloomFilter
+        """
+        rowid = literal_column("rowid")
+        async with self._event_id_bloom_lock:
+            async with self._engine.connect() as connection:
+                result = await connection.stream(
+                    select(rowid, Event.chain, Event.id).where(rowid > self._event_id_bloom_rowid).order_by(rowid))
+                async for row_id, chain, event_id in result:
+                    self._event_id_bloom.add(self._event_bloom_key(chain, event_id))
+                    self._event_id_bloom_rowid = row_id
+        return self._event_id_bloom
+
+    @_serialized
+    async def missing_events_from_index_list(self, chain: str, index_list: list) -> list:
+        """
+        Returns the event ids from `index_list` that are not yet stored in the database.
+        On SQLite, a bloom filter of the stored ids answers most lookups in memory. It is synced with the events
+        committed in the meantime before every lookup, so it never misses a stored id. Only ids that are probably
+        stored are confirmed against the database.
+
+        :param chain: The chain to filter for
+        :type chain: str
+        :param index_list: The event ids to check, e.g. ["123456-12"]
+        :type index_list: list
+        :return: The missing event ids, in the order of `index_list`
+        :rtype: list
+        """
+        if self._engine.dialect.name != "sqlite":
+            existing = await self._query_existing_ids(Event, chain, index_list)
+            return [index for index in index_list if index not in existing]
+
+        bloom = await self._sync_event_id_bloom()
+        probably_present = [index for index in index_list if self._event_bloom_key(chain, index) in bloom]
+        existing = await self._query_existing_ids(Event, chain, probably_present)
+        return [index for index in index_list if index not in existing]
+
+    @_serialized
+    async def query_event(self, chain: str, event_id: str) -> Event:
         """
         Reads an event with a given id from the database.
 
@@ -188,6 +797,4 @@ class SubscrapeDB:
         :return: The event
         :rtype: Event
         """
-        result = self._session.query(Event).get((chain, event_id))
-        return result
-
+        return await self._get_cached(Event, chain, event_id)
@@ -69,13 +69,13 @@ class MoonbeamScraper:
                         self.logger.info(f"Config asks to skip transactions of contract {contract}.")
                         continue
 
-                    for method in methods:
-                        # ignore metadata
-                        if operation.startswith("_"):
-                            continue
+                    # ignore metadata
+                    method_names = [method for method in methods if not method.startswith("_")]
+                    methods_is_dict = isinstance(methods, dict)
 
+                    for method in method_names:
                         # deduce config
-                        if type(methods) is dict:
+                        if methods_is_dict:
                             method_config = contract_config.create_inner_config(methods[method])
                         else:
                             method_config = contract_config
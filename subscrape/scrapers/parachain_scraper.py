@@ -1,8 +1,7 @@
 __author__ = 'Tommi Enenkel @alice_und_bob'
 
-from email.policy import strict
+import asyncio
 import logging
-import string
 from subscrape.apis.subscan_wrapper import SubscanWrapper
 
 
@@ -26,27 +25,31 @@ class ParachainScraper:
         """
         items = []
 
-        for operation in operations:
-            if operation.startswith("_"):
-                continue
+        try:
+            for operation in operations:
+                if operation.startswith("_"):
+                    continue
 
-            if operation == "extrinsics":
-                modules = operations[operation]
-                new_items = await self.scrape_module_calls(modules, chain_config, self.api.fetch_extrinsic_metadata)
-            elif operation == "extrinsics-list":
-                extrinsics_list = operations[operation]
-                new_items = await self.api.fetch_extrinsics(extrinsics_list)
-            elif operation == "events":
-                modules = operations[operation]
-                new_items = await self.scrape_module_calls(modules, chain_config, self.api.fetch_event_metadata)
-            elif operation == "events-list":
-                events_list = operations[operation]
-                new_items = await self.api.fetch_events(events_list)
-            else:
-                self.logger.error(f"config contained an operation that does not exist: {operation}")
-                exit
+                if operation == "extrinsics":
+                    modules = operations[operation]
+                    new_items = await self.scrape_module_calls(modules, chain_config, self.api.fetch_extrinsic_metadata)
+                elif operation == "extrinsics-list":
+                    extrinsics_list = operations[operation]
+                    new_items = await self.api.fetch_extrinsics(extrinsics_list)
+                elif operation == "events":
+                    modules = operations[operation]
+                    new_items = await self.scrape_module_calls(modules, chain_config, self.api.fetch_event_metadata)
+                elif operation == "events-list":
+                    events_list = operations[operation]
+                    new_items = await self.api.fetch_events(events_list)
+                else:
+                    self.logger.error(f"config contained an operation that does not exist: {operation}")
+                    continue
 
-            items.extend(new_items)
+                items.extend(new_items)
+        finally:
+            # return the connection to the pool, the session is reopened when the database is used again
+            await self.api.db.close()
 
         return items
 
@@ -66,15 +69,66 @@ class ParachainScraper:
         items = []
         extrinsic_config = chain_config.create_inner_config(modules)
 
-        # if we want to scrape all extrinsics, modules is None. In that case, we just set it to a list containing None
-        if modules is None:
-            modules = [None]
+        # config wants us to skip the whole scope? then there is no need to walk the modules
+        if extrinsic_config.skip:
+            self.logger.info("Config asks to skip all module calls")
+            return items
+
+        # bounds the number of calls that are scraped at the same time
+        semaphore = asyncio.Semaphore(chain_config.concurrency)
+
+        async def fetch(module, call, call_config):
+            async with semaphore:
+                # every call gets its own transaction, so that one call's flush() does not commit the half-written
+                # data of the others and a failing call is rolled back
+                async with self.api.db.transaction():
+                    return await fetch_function(module, call, call_config)
+
+        tasks = []
+        for module, call, call_config in self._resolve_module_calls(modules, extrinsic_config):
+            # config wants us to skip this call?
+            if call_config.skip:
+                self.logger.info(f"Config asks to skip {module} {call}")
+                continue
+
+            # go
+            tasks.append(asyncio.ensure_future(fetch(module, call, call_config)))
+
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # stop the other calls and wait until their transactions are rolled back
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        for new_items in results:
+            items.extend(new_items)
+        return items
+
+    def _resolve_module_calls(self, modules, extrinsic_config) -> list:
+        """
+        Flattens the modules/calls tree of the config into a list, resolving the config of every call on the way.
+        Every inner config is created exactly once.
+
+        :param modules: dict of extrinsic modules to look for, like `system`, `utility`, etc
+        :type modules: dict
+        :param extrinsic_config: the `ScrapeConfig` of the modules
+        :type extrinsic_config: ScrapeConfig
+        :return: list of `(module, call, call_config)` tuples
+        :rtype: list
+        """
+        module_calls = []
 
-        for module in modules:
+        # if we want to scrape all extrinsics, modules is None. In that case, we just use a list containing None
+        if modules is None:
+            module_names = [None]
+        else:
             # ignore metadata
-            if (type(module) is string or type(module) is str) and module.startswith("_"):
-                continue
+            module_names = [module for module in modules if not module.startswith("_")]
 
+        for module in module_names:
             # if we want to scrape all extrinsics, we set call to None. Otherwise, take list of calls from the module
             if module is None:
                 calls = None
@@ -83,27 +137,20 @@ class ParachainScraper:
 
             module_config = extrinsic_config.create_inner_config(calls)
 
-            # if we want to scrape all calls, calls is None. In that case, we just set it to a list containing None
+            # if we want to scrape all calls, calls is None. In that case, we just use a list containing None
             if calls is None:
-                calls = [None]
-
-            for call in calls:
+                call_names = [None]
+            else:
                 # ignore metadata
-                if (type(call) is string or type(call) is str) and call.startswith("_"):
-                    continue
+                call_names = [call for call in calls if not call.startswith("_")]
+            calls_is_dict = isinstance(calls, dict)
 
+            for call in call_names:
                 # deduce config
-                if type(calls) is dict:
+                if calls_is_dict:
                     call_config = module_config.create_inner_config(calls[call])
                 else:
                     call_config = module_config
 
-                # config wants us to skip this call?
-                if call_config.skip:
-                    self.logger.info(f"Config asks to skip {module} {call}")
-                    continue
-
-                # go
-                new_items = await fetch_function(module, call, call_config)
-                items.extend(new_items)
-        return items
+                module_calls.append((module, call, call_config))
+        return module_calls
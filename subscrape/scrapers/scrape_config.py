@@ -1,6 +1,12 @@
 __author__ = 'Tommi Enenkel @alice_und_bob'
 
 import copy
+import logging
+from subscrape.db.subscrape_db import POOL_SIZE, POOL_MAX_OVERFLOW
+
+# every concurrently scraped call can check out up to two pooled connections at a time (its session and the bloom
+# filter sync of `missing_events_from_index_list`) and the shared session of the database needs one as well
+MAX_CONCURRENCY = (POOL_SIZE + POOL_MAX_OVERFLOW - 1) // 2
 
 
 class ScrapeConfig:
@@ -13,6 +19,7 @@ class ScrapeConfig:
         self.db_connection_string = None
         self.auto_hydrate = True
         self.stop_on_known_data = True
+        self.concurrency = 4
         self._set_config(config)
 
     def _set_config(self, config):
@@ -59,6 +66,13 @@ class ScrapeConfig:
         if stop_on_known_data is not None:
             self.stop_on_known_data = stop_on_known_data
 
+        concurrency = config.get("_concurrency", None)
+        if concurrency is not None:
+            if not 1 <= concurrency <= MAX_CONCURRENCY:
+                logging.getLogger(__name__).warning(
+                    f"_concurrency must be between 1 and {MAX_CONCURRENCY}, but is {concurrency}. Clamping it.")
+            self.concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+
     def create_inner_config(self, config):
         """
         creates a config that can be nested to lower layers
@@ -66,7 +80,12 @@ class ScrapeConfig:
         :param config: JSON dict of the scrape config
         :type config: dict
         """
-        result = copy.deepcopy(self)
+        # configs are never modified after creation, so layers without own metadata can share their parent's config
+        if type(config) is not dict:
+            return self
+
+        # `_set_config` only rebinds attributes, so a shallow copy suffices
+        result = copy.copy(self)
         result._set_config(config)
         return result
 
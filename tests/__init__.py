@@ -2,3 +2,4 @@ from . import test_db
 from . import test_events
 from . import test_extrinsics
 from . import test_moonbeam_scraper
+from . import test_parachain_scraper
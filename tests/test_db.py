@@ -1,8 +1,11 @@
+import asyncio
 import subscrape
 from subscrape.db.subscrape_db import SubscrapeDB, Extrinsic, Event
 import pytest
 import datetime
 import substrateinterface.utils.ss58 as ss58
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 @pytest.mark.asyncio
@@ -43,15 +46,235 @@ async def test_db():
         finalized=True
     )
 
-    db.write_item(extrinsic)
-    db.write_item(event)
-    db.flush()
+    await db.write_item(extrinsic)
+    await db.write_item(event)
+    await db.flush()
 
-    extrinsic = db.query_extrinsic("chain", "123-1")
+    extrinsic = await db.query_extrinsic("chain", "123-1")
     assert extrinsic is not None
     assert extrinsic.id == "123-1"
-    assert len(extrinsic.events) == 1
-    assert extrinsic.events[0].id == "123-5"
-    assert extrinsic.events[0].extrinsic.extrinsic_hash == "0x123"
+    events = await extrinsic.awaitable_attrs.events
+    assert len(events) == 1
+    assert events[0].id == "123-5"
+    assert (await events[0].awaitable_attrs.extrinsic).extrinsic_hash == "0x123"
 
-    db.close()
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_missing_events_from_index_list():
+    subscrape.wipe_cache()
+    db_connection_string = "sqlite:///data/cache/test_db.db"
+    db = SubscrapeDB(db_connection_string)
+
+    # more ids than fit into a single `IN (...)` chunk
+    stored_ids = [f"{block}-1" for block in range(0, 2000, 2)]
+    await db.write_events([{"chain": "chain", "id": event_id} for event_id in stored_ids])
+    await db.flush()
+
+    index_list = [f"{block}-1" for block in range(2000)]
+    missing = await db.missing_events_from_index_list("chain", index_list)
+    assert missing == [f"{block}-1" for block in range(1, 2000, 2)]
+
+    missing = await db.missing_events_from_index_list("other_chain", stored_ids[:3])
+    assert missing == stored_ids[:3]
+
+    # events written after the lookup structures have been built must be found as well
+    await db.write_events([{"chain": "chain", "id": "1-1"}])
+    await db.flush()
+    missing = await db.missing_events_from_index_list("chain", ["1-1", "3-1"])
+    assert missing == ["3-1"]
+
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_missing_events_written_by_another_instance():
+    subscrape.wipe_cache()
+    db_connection_string = "sqlite:///data/cache/test_db.db"
+    db = SubscrapeDB(db_connection_string)
+    other_db = SubscrapeDB(db_connection_string)
+
+    # builds the lookup structures of `db`
+    assert await db.missing_events_from_index_list("chain", ["1-1"]) == ["1-1"]
+
+    await other_db.write_events([{"chain": "chain", "id": "1-1"}])
+    await other_db.flush()
+    assert await db.missing_events_from_index_list("chain", ["1-1", "2-1"]) == ["2-1"]
+
+    await other_db.close()
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_missing_events_written_concurrently():
+    subscrape.wipe_cache()
+    db_connection_string = "sqlite:///data/cache/test_db.db"
+    db = SubscrapeDB(db_connection_string)
+    await db.write_events([{"chain": "chain", "id": f"{block}-1"} for block in range(5000)])
+    await db.flush()
+
+    async def lookup():
+        async with db.transaction():
+            return await db.missing_events_from_index_list("chain", ["race-9"])
+
+    async def write():
+        async with db.transaction():
+            await db.write_events([{"chain": "chain", "id": "race-9"}])
+            await db.flush()
+
+    # the event is committed while the lookup structures are being built
+    await asyncio.gather(lookup(), write())
+    assert await db.missing_events_from_index_list("chain", ["race-9"]) == []
+
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_extrinsics():
+    subscrape.wipe_cache()
+    db_connection_string = "sqlite:///data/cache/test_db.db"
+    db = SubscrapeDB(db_connection_string)
+
+    # spans multiple chunks of the stream
+    rows = [{"chain": "chain", "id": f"{block}-1", "module": "module", "call": "call"} for block in range(2500)]
+    await db.write_extrinsics(rows)
+    await db.flush()
+
+    ids = [extrinsic.id async for extrinsic in db.stream_extrinsics(chain="chain", module="module")]
+    assert sorted(ids) == sorted(row["id"] for row in rows)
+
+    ids = [row.id async for row in db.stream_extrinsics(chain="chain", columns=[Extrinsic.id])]
+    assert len(ids) == 2500
+
+    # writing known extrinsics again is a no-op instead of an IntegrityError
+    await db.write_extrinsics(rows[:10] + [{"chain": "chain", "id": "2500-1", "module": "module", "call": "call"}])
+    await db.flush()
+    ids = [row.id async for row in db.stream_extrinsics(chain="chain", columns=[Extrinsic.id])]
+    assert len(ids) == 2501
+
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_compressed_params():
+    subscrape.wipe_cache()
+    db_connection_string = "sqlite:///data/cache/test_db.db"
+    db = SubscrapeDB(db_connection_string)
+
+    params = [{"name": "call", "type": "Call", "value": {"module": "module"}}]
+    await db.write_extrinsics([{"chain": "chain", "id": "1-1", "params": params, "error": None}])
+    await db.flush()
+    assert (await db.query_extrinsic("chain", "1-1")).params == params
+
+    # params are stored as compressed BLOB, but JSON text written by older versions can still be read
+    stored, = (await db._session.execute(text("SELECT params FROM extrinsics WHERE id = '1-1'"))).one()
+    assert isinstance(stored, bytes)
+    await db._session.execute(text("INSERT INTO extrinsics (chain, id, params) VALUES ('chain', '2-1', '{\"a\": 1}')"))
+    await db.flush()
+    assert (await db.query_extrinsic("chain", "2-1")).params == {"a": 1}
+
+    await db.close()
+
+
+def count_session_reads(monkeypatch):
+    """
+    Counts the reads by primary key that reach the session instead of being served from the read cache.
+    """
+    reads = []
+    get = AsyncSession.get
+
+    async def counting_get(self, *args, **kwargs):
+        reads.append(args)
+        return await get(self, *args, **kwargs)
+
+    monkeypatch.setattr(AsyncSession, "get", counting_get)
+    return reads
+
+
+@pytest.mark.asyncio
+async def test_read_cache(monkeypatch):
+    subscrape.wipe_cache()
+    db_connection_string = "sqlite:///data/cache/test_db.db"
+    db = SubscrapeDB(db_connection_string)
+    await db.write_extrinsics([{"chain": "chain", "id": "1-1", "module": "module", "call": "call"}])
+    await db.write_events([{"chain": "chain", "id": "1-2", "extrinsic_id": "1-1"}])
+    await db.flush()
+    reads = count_session_reads(monkeypatch)
+
+    extrinsic = await db.query_extrinsic("chain", "1-1")
+    assert await db.query_extrinsic("chain", "1-1") is extrinsic
+    event = await db.query_event("chain", "1-2")
+    assert await db.query_event("chain", "1-2") is event
+    assert len(reads) == 2
+
+    # items that do not exist are not cached
+    assert await db.query_extrinsic("chain", "2-1") is None
+    assert await db.query_extrinsic("chain", "2-1") is None
+    assert len(reads) == 4
+
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_read_cache_forgets_written_items():
+    subscrape.wipe_cache()
+    db_connection_string = "sqlite:///data/cache/test_db.db"
+    db = SubscrapeDB(db_connection_string)
+    await db.write_extrinsics([{"chain": "chain", "id": f"{block}-1"} for block in range(3)])
+    await db.flush()
+    for block in range(3):
+        await db.query_extrinsic("chain", f"{block}-1")
+    assert len(db._read_cache) == 3
+
+    await db.write_item(Extrinsic(chain="chain", id="0-1"))
+    assert (Extrinsic, "chain", "0-1") not in db._read_cache
+    await db.write_items([Extrinsic(chain="chain", id="1-1"), Event(chain="chain", id="1-1")])
+    assert (Extrinsic, "chain", "1-1") not in db._read_cache
+    assert (Extrinsic, "chain", "2-1") in db._read_cache
+
+    # the written items conflict with the stored ones and are discarded with the session
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_read_cache_is_bypassed_in_transactions(monkeypatch):
+    subscrape.wipe_cache()
+    db_connection_string = "sqlite:///data/cache/test_db.db"
+    db = SubscrapeDB(db_connection_string)
+    await db.write_extrinsics([{"chain": "chain", "id": "1-1"}])
+    await db.flush()
+    reads = count_session_reads(monkeypatch)
+
+    async with db.transaction():
+        assert (await db.query_extrinsic("chain", "1-1")).id == "1-1"
+        assert (await db.query_extrinsic("chain", "1-1")).id == "1-1"
+    # the items of the transaction's session are detached now and must not be served to the shared session
+    assert len(db._read_cache) == 0
+    assert len(reads) == 2
+
+    await db.query_extrinsic("chain", "1-1")
+    assert len(db._read_cache) == 1
+    assert len(reads) == 3
+
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_read_cache_is_cleared_on_close(monkeypatch):
+    subscrape.wipe_cache()
+    db_connection_string = "sqlite:///data/cache/test_db.db"
+    db = SubscrapeDB(db_connection_string)
+    await db.write_extrinsics([{"chain": "chain", "id": "1-1"}])
+    await db.flush()
+    reads = count_session_reads(monkeypatch)
+
+    extrinsic = await db.query_extrinsic("chain", "1-1")
+    await db.close()
+    assert len(db._read_cache) == 0
+
+    # the next read opens a new session and loads the item again
+    assert await db.query_extrinsic("chain", "1-1") is not extrinsic
+    assert len(reads) == 2
+
+    await db.close()
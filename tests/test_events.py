@@ -28,13 +28,13 @@ async def test_fetch_events_list():
     logging.info("testing")
 
     db = SubscrapeDB()
-    event = db.query_event(chain, event_index)
+    event = await db.query_event(chain, event_index)
 
     assert event is not None
     assert event.extrinsic_id == '14238250-2'
     assert type(event.params) is list
 
-    db.close()
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -62,7 +62,7 @@ async def test_fetch_and_hydrate_event(auto_hydrate):
     logging.info("testing")
 
     db = SubscrapeDB()
-    event = db.query_event(chain, "700000-0")
+    event = await db.query_event(chain, "700000-0")
     assert event is not None, "The event should exist in the database"
     assert event.extrinsic_id == "700000-0"
     if auto_hydrate:
@@ -70,7 +70,7 @@ async def test_fetch_and_hydrate_event(auto_hydrate):
     else:
         assert event.params is None, "Non-hydrated events should have no params"
 
-    db.close()
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -98,14 +98,13 @@ async def test_fetch_events_by_module_event():
     logging.info("testing")
 
     db = SubscrapeDB()
-    events = db.query_events(chain=chain, module=module_name, event=event_name).all()
-
-    events = [e for e in events if e.id == "52631-4"]
+    events = await db.query_events(chain=chain, module=module_name, event=event_name, event_ids=["52631-4"],
+                                   columns=[Event.id, Event.extrinsic_id])
     assert len(events) == 1, "Expected 1 event"
     event_name:Event = events[0]
     assert event_name.extrinsic_id == '52631-3'
 
-    db.close()
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -134,19 +133,17 @@ async def test_fetch_events_by_module():
 
     db = SubscrapeDB()
 
-    events = db.query_events(chain=chain, module=module_name, event=event_names[0]).all()
-    events = [e for e in events if e.id == "14966317-39"]
+    events = await db.query_events(chain=chain, module=module_name, event=event_names[0], event_ids=["14966317-39"])
     assert len(events) == 1, "Expected 1 event"
     event: Event = events[0]
     assert event.extrinsic_id == '14966317-2'
 
-    events = db.query_events(chain=chain, module=module_name, event=event_names[1]).all()
-    events = [e for e in events if e.id == "14938460-47"]
+    events = await db.query_events(chain=chain, module=module_name, event=event_names[1], event_ids=["14938460-47"])
     assert len(events) == 1, "Expected 1 event"
     event = events[0]
     assert event.extrinsic_id == '14938460-4'
 
-    db.close()
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -173,12 +170,11 @@ async def test_fetch_events_by_address():
 
     logging.info("testing")
     db = SubscrapeDB()
-    events_query = db.query_events()
-    event = db.query_event(chain, "14804812-56")
+    event = await db.query_event(chain, "14804812-56")
     assert event is not None, "The event should exist in the database"
     assert event.extrinsic_id == "14804812-11"
 
-    db.close()
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -207,12 +203,11 @@ async def test_fetch_events_repeatedly():
 
     logging.info("testing")
     db = SubscrapeDB()
-    events_query = db.query_events()
-    event = db.query_event(chain, "14804812-56")
+    event = await db.query_event(chain, "14804812-56")
     assert event is not None, "The event should exist in the database"
     assert event.extrinsic_id == "14804812-11"
 
-    db.close()
+    await db.close()
 
 
 @pytest.mark.asyncio
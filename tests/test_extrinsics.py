@@ -1,4 +1,4 @@
-from subscrape.db.subscrape_db import SubscrapeDB
+from subscrape.db.subscrape_db import SubscrapeDB, Extrinsic
 import logging
 import subscrape
 import pytest
@@ -26,14 +26,14 @@ async def test_fetch_extrinsics_list():
     logging.info("testing")
 
     db = SubscrapeDB()
-    extrinsic = db.query_extrinsic(chain, extrinsic_idx)
+    extrinsic = await db.query_extrinsic(chain, extrinsic_idx)
 
     assert extrinsic is not None
     assert extrinsic.extrinsic_hash == '0x408aacc9a42189836d615944a694f4f7e671a89f1a30bf0977a356cf3f6c301c'
     assert extrinsic.origin_public_key == "1eb38b0d5178bc680c10a204f81164946a25078c6d3b5f6813cef61c3aef4843"
     assert type(extrinsic.params) is list
 
-    db.close()
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -60,14 +60,14 @@ async def test_fetch_and_hydrate_extrinsic(auto_hydrate):
     logging.info("testing")
 
     db = SubscrapeDB()
-    extrinsic = db.query_extrinsic(chain, "15228214-2")
+    extrinsic = await db.query_extrinsic(chain, "15228214-2")
     assert extrinsic is not None, "This extrinsic should exist in the database"
     assert extrinsic.extrinsic_hash == '0x8863fb33e2bac6f48b8a0c6a08a27871631046a2654fcd4574f4e8faaaa7cba1'
     if auto_hydrate:
         assert extrinsic.params is not None, "Hydrated extrinsic should have params"
     else:
         assert extrinsic.params is None, "Non-hydrated extrinsic should not have params"
-    db.close()
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -90,14 +90,13 @@ async def test_fetch_extrinsics_by_module_call():
     logging.info("testing")
 
     db = SubscrapeDB()
-    extrinsics = db.query_extrinsics(module="bounties", call="propose_bounty").all()
-
-    extrinsics = [e for e in extrinsics if e.id == "14061443-2"]
+    extrinsics = await db.query_extrinsics(module="bounties", call="propose_bounty", extrinsic_ids=["14061443-2"],
+                                           columns=[Extrinsic.id, Extrinsic.extrinsic_hash])
     assert len(extrinsics) == 1, "Expected 1 extrinsic"
     extrinsic = extrinsics[0]
     assert extrinsic.extrinsic_hash == '0x9f2a81d8d92884122d122d806276da7ff9b440a0a273bc3898cbd4072d5f62e1'
 
-    db.close()
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -121,19 +120,17 @@ async def test_fetch_extrinsics_by_module():
 
     db = SubscrapeDB()
 
-    extrinsics = db.query_extrinsics(module="bounties", call="propose_bounty")
-    extrinsics = [e for e in extrinsics if e.id == "12935940-3"]
+    extrinsics = await db.query_extrinsics(module="bounties", call="propose_bounty", extrinsic_ids=["12935940-3"])
     assert len(extrinsics) == 1, "Expected 1 extrinsic"
     extrinsic = extrinsics[0]
     assert extrinsic.extrinsic_hash == '0x28b3e9dc097036a98b43b9792745be89d3fecbbca71200b45a2aba901c7cc5af'
 
-    extrinsics = db.query_extrinsics(module="bounties", call="extend_bounty_expiry")
-    extrinsics = [e for e in extrinsics if e.id == "14534356-3"]
+    extrinsics = await db.query_extrinsics(module="bounties", call="extend_bounty_expiry", extrinsic_ids=["14534356-3"])
     assert len(extrinsics) == 1, "Expected 1 extrinsic"
     extrinsic = extrinsics[0]
     assert extrinsic.extrinsic_hash == '0xf02b930789a35b4b942006c60ae6c83daee4d87237e213bab4ce0e7d93cfb0f4'
 
-    db.close()
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -159,11 +156,11 @@ async def test_fetch_extrinsics_by_address():
     logging.info("testing")
 
     db = SubscrapeDB()
-    extrinsic = db.query_extrinsic(chain, "14815834-2")
+    extrinsic = await db.query_extrinsic(chain, "14815834-2")
     assert extrinsic is not None, "This extrinsic should exist in the database"
     assert extrinsic.extrinsic_hash == '0xc015e661ce5a763d2377d5216037677f5e16fe1a5ec4471de3acbd6be683461b'
 
-    db.close()
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -191,11 +188,11 @@ async def test_fetch_extrinsics_repeatedly():
     logging.info("testing")
 
     db = SubscrapeDB()
-    extrinsic = db.query_extrinsic(chain, "14815834-2")
+    extrinsic = await db.query_extrinsic(chain, "14815834-2")
     assert extrinsic is not None, "This extrinsic should exist in the database"
     assert extrinsic.extrinsic_hash == '0xc015e661ce5a763d2377d5216037677f5e16fe1a5ec4471de3acbd6be683461b'
 
-    db.close()
+    await db.close()
 
 # injection tests
 # https://kusama.subscan.io/extrinsic/15356089-2
@@ -10,6 +10,8 @@ import time
 repo_root = Path(__file__).parent.parent.resolve()
 sys.path.append(str(repo_root))
 import subscrape
+from subscrape.scrapers.moonbeam_scraper import MoonbeamScraper
+from subscrape.scrapers.scrape_config import ScrapeConfig
 
 test_scope = "all"      # 'all', 'swaps', 'liquidity', 'kbtc'
 new_only = False
@@ -1248,3 +1250,37 @@ def _assert_value_within_range(actual, expected, tolerance_percent=1):
     upper_limit = expected_float + tolerance
     assert actual_float >= lower_limit
     assert actual_float <= upper_limit
+
+
+class StubMoonscan:
+    """Records the requested addresses and feeds a single transaction calling `0xe8e33700` to the processor."""
+    endpoint = "stub"
+
+    def __init__(self):
+        self.fetched = []
+
+    async def fetch_and_process_transactions(self, address, processor, config):
+        self.fetched.append(address)
+        await processor({"input": "0xe8e33700" + "00" * 32, "from": "0xABC"})
+
+
+@pytest.mark.asyncio
+async def test__metadata_keys_are_not_scraped_as_methods(tmp_path):
+    contract = "0xaa30ef758139ae4a7f798112902bf6d65612045f"
+    operations = {
+        "transactions": {
+            contract: {
+                "0xe8e33700": {},
+                "0xbaa2abde": {"_skip": True},
+                "_filter": [{"blockNumber": [{">=": 992929}]}]
+            },
+            "_filter": [{"blockNumber": [{"<=": 993002}]}]
+        }
+    }
+    moonscan_api = StubMoonscan()
+    scraper = MoonbeamScraper(tmp_path / "moonriver_", moonscan_api, None, "moonriver")
+    items_scraped = await scraper.scrape(operations, ScrapeConfig({}))
+
+    assert moonscan_api.fetched == [contract]
+    assert set(scraper.transactions) == {f"{contract}_0xe8e33700"}
+    assert items_scraped == ["0xabc"]
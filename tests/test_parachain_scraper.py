@@ -0,0 +1,142 @@
+import asyncio
+import subscrape
+import pytest
+from subscrape.apis.subscan_wrapper import SubscanWrapper
+from subscrape.db.subscrape_db import SubscrapeDB, Extrinsic
+from subscrape.scrapers.parachain_scraper import ParachainScraper
+from subscrape.scrapers.scrape_config import ScrapeConfig, MAX_CONCURRENCY
+
+# number of extrinsics per call and the block their ids start at
+CALLS = {"a": (250, 1000), "b": (130, 2000), "c": (40, 3000)}
+
+
+def fake_extrinsic(call, block):
+    return {
+        "id": block,
+        "extrinsic_index": f"{block}-1",
+        "block_num": block,
+        "block_timestamp": 1600000000 + block,
+        "call_module": "system",
+        "call_module_function": call,
+        "account_display": None,
+        "nonce": 0,
+        "extrinsic_hash": f"0x{block:064x}",
+        "success": True,
+        "fee": 1,
+        "fee_used": 1,
+        "finalized": True,
+    }
+
+
+def fake_subscan(failing_call=None, delays={}, checked_out_connections=None):
+    """
+    Returns a stub for `SubscanWrapper._query` that serves the extrinsic metadata of `CALLS` newest first.
+
+    :param failing_call: call that raises when its third page is requested
+    :param delays: seconds every response of a call is delayed by
+    :param checked_out_connections: list to append the number of checked out pooled connections to whenever a
+        page after the first one is requested
+    """
+    async def _query(self, method, headers={}, body={}, client=None):
+        if checked_out_connections is not None and "after_id" in body:
+            checked_out_connections.append(self.db._engine.pool.checkedout())
+        call = body["call"]
+        count, first_block = CALLS[call]
+        after_id = body.get("after_id", first_block + count)
+        await asyncio.sleep(delays.get(call, 0))
+        if call == failing_call and after_id <= first_block + count - 200:
+            raise Exception("Error: 500")
+
+        blocks = range(after_id - 1, max(after_id - body["row"], first_block) - 1, -1)
+        return {"count": count, "extrinsics": [fake_extrinsic(call, block) for block in blocks] or None}
+
+    return _query
+
+
+async def count_extrinsics(db, call):
+    return len(await db.query_extrinsics(chain="kusama", module="system", call=call, columns=[Extrinsic.id]))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_roll_back_on_failure(monkeypatch):
+    subscrape.wipe_cache()
+    db = SubscrapeDB("sqlite:///data/cache/test_parachain_scraper.db")
+    scraper = ParachainScraper(SubscanWrapper("kusama", db))
+    operations = {"extrinsics": {"system": list(CALLS)}}
+    chain_config = ScrapeConfig({"_auto_hydrate": False})
+
+    # `a` fails after two pages while `b` is done and `c` is still waiting for its response
+    monkeypatch.setattr(SubscanWrapper, "_query", fake_subscan(failing_call="a", delays={"a": 0.1, "c": 0.5}))
+    with pytest.raises(Exception, match="Error: 500"):
+        await scraper.scrape(operations, chain_config)
+    # `c` must have been cancelled instead of writing to the database in the background
+    await asyncio.sleep(1)
+
+    # no call may leave a partial index behind, as the next run would stop at its newest entries
+    assert await count_extrinsics(db, "a") == 0
+    assert await count_extrinsics(db, "b") == CALLS["b"][0]
+    assert await count_extrinsics(db, "c") == 0
+
+    monkeypatch.setattr(SubscanWrapper, "_query", fake_subscan())
+    items = await scraper.scrape(operations, chain_config)
+    assert len(items) == CALLS["a"][0] + CALLS["c"][0]
+    for call, (count, _) in CALLS.items():
+        assert await count_extrinsics(db, call) == count
+
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_pages_of_failing_call_are_rolled_back(monkeypatch):
+    subscrape.wipe_cache()
+    db = SubscrapeDB("sqlite:///data/cache/test_parachain_scraper.db")
+    scraper = ParachainScraper(SubscanWrapper("kusama", db))
+    operations = {"extrinsics": {"system": ["a"]}}
+    chain_config = ScrapeConfig({"_auto_hydrate": False})
+
+    written_pages = []
+    write_extrinsics = SubscrapeDB.write_extrinsics
+
+    async def record_write_extrinsics(self, rows):
+        await write_extrinsics(self, rows)
+        written_pages.append(len(rows))
+
+    monkeypatch.setattr(SubscrapeDB, "write_extrinsics", record_write_extrinsics)
+    monkeypatch.setattr(SubscanWrapper, "_query", fake_subscan(failing_call="a"))
+    with pytest.raises(Exception, match="Error: 500"):
+        await scraper.scrape(operations, chain_config)
+
+    # every page is written as soon as it arrives, but nothing is committed before the index is complete
+    assert written_pages == [100, 100]
+    assert await count_extrinsics(db, "a") == 0
+
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_release_connections_while_paging(monkeypatch):
+    subscrape.wipe_cache()
+    db = SubscrapeDB("sqlite:///data/cache/test_parachain_scraper.db")
+    scraper = ParachainScraper(SubscanWrapper("kusama", db))
+    operations = {"extrinsics": {"system": list(CALLS)}}
+    chain_config = ScrapeConfig({"_auto_hydrate": False})
+
+    checked_out_connections = []
+    # by the time the second pages are requested, every call has read its known extrinsics
+    delays = {call: 0.05 for call in CALLS}
+    monkeypatch.setattr(SubscanWrapper, "_query",
+                        fake_subscan(delays=delays, checked_out_connections=checked_out_connections))
+    await scraper.scrape(operations, chain_config)
+
+    # reading the known extrinsics must not keep a connection checked out while waiting for Subscan. only a call
+    # that is writing its index holds one
+    assert len(checked_out_connections) > 0
+    assert max(checked_out_connections) <= 1
+
+    await db.close()
+
+
+def test_concurrency_is_limited_by_the_connection_pool():
+    assert ScrapeConfig({"_concurrency": 100}).concurrency == MAX_CONCURRENCY
+    assert ScrapeConfig({"_concurrency": 0}).concurrency == 1
+    assert ScrapeConfig({"_concurrency": 3}).concurrency == 3